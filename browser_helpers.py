@@ -0,0 +1,35 @@
+
+# browser_helpers.py
+# Shared Playwright helpers for the browser-driven discovery scripts (discovery_cdp.py and
+# discovery_playwright.py): resource blocking, the one-call link scrape, per-host pacing.
+
+import time, urllib.parse as up
+from urlnorm import canonicalize
+
+# Link discovery only needs the HTML: these sub-resources are aborted on the crawl page
+BLOCKED_RESOURCES = ("image", "stylesheet", "font", "media")
+
+def block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCES:
+        route.abort()
+    else:
+        route.continue_()
+
+# One CDP round-trip per page: canonical <link> plus the page's distinct absolute hrefs
+PAGE_LINKS_JS = """() => {
+  const c = document.querySelector('link[rel="canonical"]');
+  return {canonical: c ? c.getAttribute("href") : null,
+          hrefs: Array.from(new Set(Array.from(document.querySelectorAll("a[href]"), a => a.href)))};
+}"""
+
+def wait_for_host(next_ok, url, throttle):
+    # Per-host deadline instead of a fixed sleep after every page: only wait out
+    # whatever is left of this host's `throttle` gap (page load time counts toward it)
+    host = up.urlsplit(url).netloc
+    time.sleep(max(0.0, next_ok.get(host, 0.0) - time.monotonic()))
+    next_ok[host] = time.monotonic() + throttle
+
+def canonical_url(page_url, canonical_href):
+    if canonical_href:
+        return canonicalize(up.urljoin(page_url, canonical_href))
+    return canonicalize(page_url)
@@ -1,53 +1,179 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import aiofiles
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import httpx
+from aiolimiter import AsyncLimiter
+from collections import defaultdict
+from selectolax.lexbor import LexborHTMLParser
 from urllib.parse import urljoin, urlparse
-import json
+import hashlib
+import orjson
+from xml.sax.saxutils import escape
 import os
+import threading
 import time
+import uuid
+from pybloom_live import ScalableBloomFilter
+from frontier import open_frontier
+from urlnorm import canonicalize
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 
-visited = set()
+SHARDS = 64  # power of two, so a shard is picked with a mask
 
-def scrape_page(url, domain, image_folder="images"):
-    """Fetch page content, extract text, links, images, and download images."""
+class VisitedURLs:
+    """URL dedup set: exact for small crawls, a scalable Bloom filter beyond that.
+
+    Split into SHARDS independent shards by hash(url), each with its own lock, so
+    workers on several threads only contend when they hit the same shard."""
+
+    def __init__(self, exact_limit=10_000, initial_capacity=100_000, error_rate=1e-4):
+        # The first `exact_limit` URLs (spread over the shards) go in plain sets so small
+        # crawls never hit a Bloom false positive; bigger crawls spill into the filters.
+        self.exact_limit = exact_limit // SHARDS
+        self.exact = [set() for _ in range(SHARDS)]
+        self.bloom = [ScalableBloomFilter(initial_capacity=initial_capacity // SHARDS, error_rate=error_rate)
+                      for _ in range(SHARDS)]
+        self.locks = [threading.Lock() for _ in range(SHARDS)]
+
+    def seen_or_add(self, url):
+        """True if `url` was already added; otherwise add it and return False (atomically)."""
+        s = hash(url) & (SHARDS - 1)
+        exact, bloom = self.exact[s], self.bloom[s]
+        with self.locks[s]:
+            if url in exact or url in bloom:
+                return True
+            if len(exact) < self.exact_limit:
+                exact.add(url)
+            else:
+                bloom.add(url)
+            return False
+
+visited = VisitedURLs()
+content_hash = {}  # BLAKE2b digest of a page body -> first URL that served it
+IOV_MAX = 1024  # POSIX minimum; larger batches fall back to a plain write
+
+# HTML parsing is the CPU-bound part of a page; it runs here so the event loop keeps fetching
+PARSE_POOL = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+# One pooled client for every page and image request for the whole crawl: each host's
+# TCP/TLS session is set up once, kept alive, and HTTP/2 multiplexes concurrent GETs on it
+CLIENT = httpx.AsyncClient(
+    http2=True,
+    follow_redirects=True,
+    headers={"User-Agent": "Mozilla/5.0"},
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+    timeout=10,
+)
+
+def parse_page(html_text, url):
+    """Parse one page in a worker process: (title, text, image URLs, canonical link URLs)."""
+    tree = LexborHTMLParser(html_text)
+    title_node = tree.css_first("title")
+    title = title_node.text(strip=True) if title_node else "No Title"
+    # strip the whole <p> text: text(strip=True) would glue "Hello <b>world</b>" into "Helloworld"
+    text = " ".join(p.text().strip() for p in tree.css("p"))
+    images = [urljoin(url, img.attributes["src"] or "") for img in tree.css("img[src]")]
+    hrefs = [canonicalize(urljoin(url, a.attributes["href"] or "")) for a in tree.css("a[href]")]
+    return title, text, images, hrefs
+
+def image_path(image_folder, img_url):
+    img_name = os.path.basename(urlparse(img_url).path) or f"image_{int(time.time())}.jpg"
+    return os.path.join(image_folder, img_name)
+
+async def save_image(path, body):
+    # Written under a private temp name and renamed into place, so pages saving the same
+    # file name at the same time can't interleave bytes; the last rename wins
+    tmp = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        async with aiofiles.open(tmp, "wb") as f:
+            await f.write(body)
+        os.replace(tmp, path)
+    except BaseException:
+        # don't leave a half-written .part behind in the images folder
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+def append_to_archive(path, records):
+    """Append (url, body) records to a WARC-style concatenation file with a single writev(2)."""
+    bufs = []
+    for url, body in records:
+        header = (f"WARC/1.0\r\nWARC-Type: resource\r\nWARC-Target-URI: {url}\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode()
+        bufs += [header, body, b"\r\n\r\n"]
+    if not bufs:
+        return
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0))
+    try:
+        total = sum(map(len, bufs))
+        written = os.writev(fd, bufs) if hasattr(os, "writev") and len(bufs) <= IOV_MAX else 0
+        if written < total:
+            rest = memoryview(b"".join(bufs))[written:]
+            while rest:
+                rest = rest[os.write(fd, rest):]
+    finally:
+        os.close(fd)
+
+async def scrape_page(url, domain, image_folder="images", depth=0, min_dedup_depth=1, image_archive=None):
+    """Fetch page content, extract text, links, images, and download images.
+
+    A page at `depth >= min_dedup_depth` whose body matches one already scraped is
+    returned as {"url", "duplicate_of"} without parsing it or fetching its images.
+    With `image_archive` set, images are appended to that one file instead of
+    `image_folder`."""
     try:
-        response = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=10)
+        response = await CLIENT.get(url, timeout=10)
         if response.status_code != 200:
             return None, []
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        title = soup.title.string.strip() if soup.title else "No Title"
-        text = " ".join([p.get_text().strip() for p in soup.find_all("p")])
+        digest = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+        first_url = content_hash.setdefault(digest, url)
+        if first_url != url and depth >= min_dedup_depth:
+            return {"url": url, "duplicate_of": first_url}, []
 
-        # Extract and download images
-        images = []
-        if not os.path.exists(image_folder):
+        title, text, images, all_links = await asyncio.get_running_loop().run_in_executor(
+            PARSE_POOL, parse_page, response.text, url
+        )
+
+        # Download images (all of a page's images concurrently)
+        if not image_archive and not os.path.exists(image_folder):
             os.makedirs(image_folder)
 
-        for img in soup.find_all("img", src=True):
-            img_url = urljoin(url, img["src"])
-            images.append(img_url)
+        responses = await asyncio.gather(
+            *(CLIENT.get(img_url, timeout=5) for img_url in images), return_exceptions=True
+        )
+        fetched = []
+        for img_url, img_response in zip(images, responses):
+            if isinstance(img_response, Exception):
+                print(f"⚠️ Could not download image {img_url}: {img_response}")
+            else:
+                fetched.append((img_url, img_response.content))
 
-            # Save image locally
+        # Save images locally: every file write in flight at once, or one writev into the archive
+        if image_archive:
             try:
-                img_data = requests.get(img_url, timeout=5).content
-                img_name = os.path.basename(urlparse(img_url).path) or f"image_{int(time.time())}.jpg"
-                img_path = os.path.join(image_folder, img_name)
-
-                with open(img_path, "wb") as f:
-                    f.write(img_data)
+                await asyncio.to_thread(append_to_archive, image_archive, fetched)
             except Exception as e:
-                print(f"⚠️ Could not download image {img_url}: {e}")
+                print(f"⚠️ Could not write images to {image_archive}: {e}")
+        else:
+            # one write per target file: images sharing a name (or the time-based fallback
+            # name) keep the last one, as the old one-after-another loop did
+            targets = {image_path(image_folder, img_url): (img_url, body) for img_url, body in fetched}
+            saved = await asyncio.gather(
+                *(save_image(path, body) for path, (_, body) in targets.items()),
+                return_exceptions=True
+            )
+            for (img_url, _), err in zip(targets.values(), saved):
+                if isinstance(err, Exception):
+                    print(f"⚠️ Could not download image {img_url}: {err}")
 
-        # Extract internal links (for further crawling)
+        # Keep internal links (for further crawling)
         links = []
-        all_links = []
-        for a in soup.find_all("a", href=True):
-            link = urljoin(url, a["href"])
-            all_links.append(link)
-            if urlparse(link).netloc == domain and link not in visited:
+        for link in all_links:
+            if urlparse(link).netloc == domain and not visited.seen_or_add(link):
                 links.append(link)
 
         return {
@@ -55,42 +181,90 @@ def scrape_page(url, domain, image_folder="images"):
             "title": title,
             "content": text,
             "images": images,
-            "all_links": all_links
+            "all_links": all_links,
+            "content_hash": digest
         }, links
 
     except Exception as e:
         print(f"❌ Error scraping {url}: {e}")
         return None, []
 
-def crawl(start_url, max_pages=20, max_depth=2):
-    """Crawl website up to given depth and page limit."""
+async def crawl(start_url, max_pages=20, max_depth=2, concurrency=8, throttle=1.0, frontier=None,
+                min_dedup_depth=1, image_archive=None):
+    """Crawl website up to given depth and page limit with a pool of `concurrency` workers.
+
+    `frontier` is a SQLite path or redis:// URL to keep the crawl queue in; a rerun with
+    the same value resumes without re-fetching. Default is an in-memory queue.
+    `image_archive` collects every downloaded image in one WARC-style file."""
+    start_url = canonicalize(start_url)
     domain = urlparse(start_url).netloc
-    to_visit = [(start_url, 0)]
+    to_visit = open_frontier(frontier)
+    to_visit.push(start_url, 0)
+    visited.seen_or_add(start_url)
     results = []
+    # polite crawling: one page per `throttle` seconds per host, not per crawl (0 = no wait)
+    limiters = defaultdict(lambda: AsyncLimiter(1, throttle) if throttle > 0 else contextlib.nullcontext())
+    active = 0
+    wake = asyncio.Condition()  # notified when links are queued or the last page finishes
 
-    while to_visit and len(results) < max_pages:
-        url, depth = to_visit.pop(0)
-        if url in visited or depth > max_depth:
-            continue
-        visited.add(url)
+    async def wake_workers():
+        async with wake:
+            wake.notify_all()
 
-        page_data, links = scrape_page(url, domain)
-        if page_data:
-            results.append(page_data)
-            print(f"✅ Scraped: {url}")
-
-            # Add new links to crawl queue
-            for link in links:
-                if link not in visited:
-                    to_visit.append((link, depth + 1))
+    async def worker():
+        nonlocal active
+        while len(results) < max_pages:
+            item = to_visit.pop()
+            if item is None:
+                if active == 0:
+                    return
+                # another worker may still add links: sleep until it does or ends
+                async with wake:
+                    await wake.wait()
+                continue
+            url, depth = item
+            active += 1
+            try:
+                if depth > max_depth:
+                    continue
+                async with limiters[urlparse(url).netloc]:
+                    page_data, links = await scrape_page(url, domain, depth=depth,
+                                                         min_dedup_depth=min_dedup_depth,
+                                                         image_archive=image_archive)
+                if page_data and len(results) < max_pages:
+                    results.append(page_data)
+                    if "duplicate_of" in page_data:
+                        print(f"♻️ Duplicate: {url} (same content as {page_data['duplicate_of']})")
+                    else:
+                        print(f"✅ Scraped: {url}")
 
-        time.sleep(1)  # polite crawling
+                    # Add new links to crawl queue (already deduped in scrape_page)
+                    for link in links:
+                        to_visit.push(link, depth + 1)
+                    if links:
+                        await wake_workers()
+            finally:
+                active -= 1
+                to_visit.done(url)
+                if active == 0:
+                    await wake_workers()
 
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        to_visit.close()
     return results
 
 def save_json(data, filename="output.json"):
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    # Streamed one record at a time with orjson (UTF-8 bytes, 2-space indent), so the
+    # whole crawl is never built up as one big string before the write
+    with open(filename, "wb") as f:
+        f.write(b"[\n")
+        for i, record in enumerate(data):
+            if i:
+                f.write(b",\n")
+            f.write(orjson.dumps(record, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        f.write(b"\n]\n")
     print(f"📁 Data saved to {filename}")
 
 def save_pdf(data, filename="output.pdf"):
@@ -98,30 +272,42 @@ def save_pdf(data, filename="output.pdf"):
     styles = getSampleStyleSheet()
     content = []
 
+    # Each Paragraph is a markup parse plus a layout box, so a page's lines are joined
+    # with <br/> into at most three of them instead of one per URL/image/link
     for page in data:
-        content.append(Paragraph(f"<b>URL:</b> {page['url']}", styles["BodyText"]))
-        content.append(Paragraph(f"<b>Title:</b> {page['title']}", styles["Heading2"]))
-        content.append(Paragraph(page["content"][:1500] + "...", styles["BodyText"]))
+        if "duplicate_of" in page:
+            content.append(Paragraph(f"<b>URL:</b> {escape(page['url'])}<br/>"
+                                     f"<b>Duplicate of:</b> {escape(page['duplicate_of'])}", styles["BodyText"]))
+            content.append(Spacer(1, 20))
+            continue
+        content.append(Paragraph(f"<b>URL:</b> {escape(page['url'])}", styles["BodyText"]))
+        content.append(Paragraph(f"<b>Title:</b> {escape(page['title'])}", styles["Heading2"]))
 
+        lines = [escape(page["content"][:1500]) + "..."]
         if page["images"]:
-            content.append(Paragraph("<b>Images:</b>", styles["BodyText"]))
-            for img in page["images"][:5]:
-                content.append(Paragraph(img, styles["BodyText"]))
-
+            lines.append("<b>Images:</b>")
+            lines.extend(escape(img) for img in page["images"][:5])
         if page["all_links"]:
-            content.append(Paragraph("<b>Links:</b>", styles["BodyText"]))
-            for lnk in page["all_links"][:10]:
-                content.append(Paragraph(lnk, styles["BodyText"]))
+            lines.append("<b>Links:</b>")
+            lines.extend(escape(lnk) for lnk in page["all_links"][:10])
+        content.append(Paragraph("<br/>".join(lines), styles["BodyText"]))
 
         content.append(Spacer(1, 20))
 
     doc.build(content)
     print(f"📁 Data saved to {filename}")
 
-if __name__ == "__main__":
+async def main():
     start_url = "https://www.python.org"  # 🔹 change this
-    scraped_data = crawl(start_url, max_pages=30, max_depth=2)
+    try:
+        scraped_data = await crawl(start_url, max_pages=30, max_depth=2)
+    finally:
+        await CLIENT.aclose()
+        PARSE_POOL.shutdown()
 
     # Save outputs
     save_json(scraped_data, "website_data.json")
     save_pdf(scraped_data, "website_data.pdf")
+
+if __name__ == "__main__":
+    asyncio.run(main())
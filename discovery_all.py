@@ -2,16 +2,20 @@
 # discovery_all.py
 # Discover ALL in-scope Magenta Pulse pages (plans, devices, promotions)
 # Usage:
-#   pip install httpx lxml pandas openpyxl defusedxml
+#   pip install httpx lxml pandas openpyxl xlsxwriter aiolimiter pyahocorasick
 #   python discovery_all.py --base https://magentapulse.t-mobile.com --workbook TFB_URL_Inventory.xlsx --out TFB_URL_Inventory_FULL.xlsx
 
-import argparse, re, time, sys, urllib.parse as up
-from collections import deque, defaultdict
-from datetime import datetime
+import argparse, asyncio, contextlib, hashlib, zlib, urllib.parse as up
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import httpx
+from aiolimiter import AsyncLimiter
 from lxml import html, etree
-from defusedxml.ElementTree import fromstring as safe_fromstring
 import pandas as pd
+from frontier import open_frontier
+from urlnorm import canonicalize, same_domain
+from scope import compile_allow, compile_block, in_scope
+from inventory import write_inventory
 
 DEF_USER_AGENT = "Mozilla/5.0 (compatible; TFB-Discovery/1.0; +https://example.org)"
 
@@ -19,16 +23,16 @@ def read_patterns(xl_path):
     inc = pd.read_excel(xl_path, sheet_name="Include_Patterns")
     exc = pd.read_excel(xl_path, sheet_name="Exclude_Patterns")
     seeds = pd.read_excel(xl_path, sheet_name="Seeds")["url"].dropna().tolist()
-    allow = [(re.compile(p, re.I), hint) for p, hint in zip(inc["allowed_path_regex"], inc["entity_hint"])]
-    block = [re.compile(p, re.I) for p in exc["disallowed_path_regex"]]
+    allow = compile_allow(list(zip(inc["allowed_path_regex"], inc["entity_hint"])))
+    block = compile_block(exc["disallowed_path_regex"])
     return seeds, allow, block
 
-def robots_sitemaps(base, cli):
+async def robots_sitemaps(base, cli):
     # Try robots.txt
     rob = up.urljoin(base, "/robots.txt")
     sitemaps = []
     try:
-        r = cli.get(rob)
+        r = await cli.get(rob)
         if r.status_code == 200:
             for line in r.text.splitlines():
                 line = line.strip()
@@ -38,125 +42,174 @@ def robots_sitemaps(base, cli):
         pass
     return sitemaps
 
-def parse_sitemap(cli, url):
-    urls = []
+async def parse_sitemap(cli, url):
+    # Stream the sitemap through a pull parser: only the current <loc> is ever in memory,
+    # finished siblings are dropped as we go. Entities/network stay off (as with defusedxml).
+    urls, children = [], []
     try:
-        r = cli.get(url)
-        if r.status_code != 200:
-            return urls
-        xml = safe_fromstring(r.content)
-        tag = etree.QName(xml.tag).localname.lower()
-        if tag == "sitemapindex":
-            for sm in xml.findall(".//{*}sitemap/{*}loc"):
-                child = sm.text.strip()
-                urls.extend(parse_sitemap(cli, child))
-        elif tag == "urlset":
-            for u in xml.findall(".//{*}url/{*}loc"):
-                urls.append(u.text.strip())
+        async with cli.stream("GET", url) as r:
+            if r.status_code != 200:
+                return urls
+            parser = etree.XMLPullParser(events=("end",), tag="{*}loc", huge_tree=True,
+                                         resolve_entities=False, no_network=True)
+            gunzip = None
+            async for chunk in r.aiter_bytes():
+                if gunzip is None:
+                    # .xml.gz served without Content-Encoding: inflate it ourselves
+                    gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS) if chunk[:2] == b"\x1f\x8b" else False
+                if gunzip:
+                    chunk = gunzip.decompress(chunk)
+                parser.feed(chunk)
+                for _, loc in parser.read_events():
+                    entry = loc.getparent()  # <sitemap> in a sitemapindex, <url> in a urlset
+                    kind = etree.QName(entry).localname.lower() if entry is not None else ""
+                    if loc.text and kind == "sitemap":
+                        children.append(loc.text.strip())
+                    elif loc.text and kind == "url":
+                        urls.append(loc.text.strip())
+                    loc.clear(keep_tail=True)
+                    if entry is not None:
+                        while entry.getprevious() is not None:
+                            del entry.getparent()[0]
     except Exception:
-        return urls
+        pass
+    for child in children:
+        urls.extend(await parse_sitemap(cli, child))
     return urls
 
-def same_domain(base, url):
-    return up.urlsplit(url).netloc.endswith(up.urlsplit(base).netloc)
-
 def canonical_url(doc, url):
     try:
         c = doc.xpath("//link[@rel='canonical']/@href")
         if c:
-            return up.urljoin(url, c[0])
+            return canonicalize(up.urljoin(url, c[0]))
     except Exception:
         pass
-    return url
-
-def in_scope(url, allow, block):
-    path = up.urlsplit(url).path
-    if any(b.search(path) for b in block):
-        return False, None
-    for pat, hint in allow:
-        if pat.search(path):
-            return True, hint
-    return False, None
-
-def discover_all(base, seeds, allow, block, max_depth=2, throttle=0.75):
-    seen = set()
-    hits = {}  # url -> entity
-    # HTTP client
-    with httpx.Client(follow_redirects=True, timeout=15, headers={"User-Agent": DEF_USER_AGENT}) as cli:
-        # Sitemaps first
-        smaps = robots_sitemaps(base, cli)
-        for sm in smaps:
-            for u in parse_sitemap(cli, sm):
-                if same_domain(base, u):
-                    ok, ent = in_scope(u, allow, block)
-                    if ok:
-                        hits[u] = ent
-
-        # BFS crawl from seeds
-        q = deque()
-        for s in seeds:
-            if same_domain(base, s):
-                q.append((s, 0))
-
-        while q:
-            url, d = q.popleft()
-            if url in seen or d > max_depth:
-                continue
-            seen.add(url)
-            try:
-                r = cli.get(url)
+    return canonicalize(url)
+
+def parse_page(text, url):
+    # Runs in a worker process: the lxml parse is the CPU-bound part of a page
+    doc = html.fromstring(text)
+    can = canonical_url(doc, url)
+    # lxml resolves every link in C (honouring <base href>, dropping unparseable ones);
+    # iterlinks() then walks only link-bearing elements instead of an XPath // scan
+    doc.resolve_base_href(handle_failures="discard")
+    doc.make_links_absolute(can, resolve_base_href=False, handle_failures="discard")
+    return can, [canonicalize(link) for el, attr, link, _ in doc.iterlinks() if el.tag == "a" and attr == "href"]
+
+async def discover_all(base, seeds, allow, block, max_depth=2, throttle=0.75, workers=16, frontier=None,
+                       min_dedup_depth=1):
+    # Queue, seen-set and hits live in the frontier (SQLite/Redis) so a rerun resumes;
+    # `enqueued` is just an in-process cache in front of it.
+    base_netloc = up.urlsplit(base).netloc.lower()
+    frontier = open_frontier(frontier)
+    enqueued = set()  # every URL this run queued (or saw as a canonical)
+    hits = frontier.hits()  # url -> entity
+    hashes = {}  # url -> BLAKE2b digest of its body
+    notes = {}  # url -> "duplicate_of <url>" for pages that repeat an earlier body
+    first_url = {}  # digest -> first URL that served that body
+    # Politeness is per host: one request every `throttle` seconds to each netloc (0 = no wait)
+    limiters = defaultdict(lambda: AsyncLimiter(1, throttle) if throttle > 0 else contextlib.nullcontext())
+    # Pages are parsed in a process pool so the event loop never waits on lxml
+    loop = asyncio.get_running_loop()
+    pool = ProcessPoolExecutor()
+    try:
+        # HTTP client
+        async with httpx.AsyncClient(follow_redirects=True, timeout=15, headers={"User-Agent": DEF_USER_AGENT}) as cli:
+            # Sitemaps first
+            smaps = await robots_sitemaps(base, cli)
+            for sm in smaps:
+                for u in await parse_sitemap(cli, sm):
+                    u = canonicalize(u)
+                    if same_domain(base_netloc, u):
+                        ok, ent = in_scope(u, allow, block)
+                        if ok:
+                            hits[u] = ent
+                            frontier.add_hit(u, ent)
+
+            # BFS crawl from seeds with a pool of workers sharing one frontier
+            for s in map(canonicalize, seeds):
+                if same_domain(base_netloc, s) and s not in enqueued:
+                    enqueued.add(s)
+                    frontier.push(s, 0)
+            active = 0
+            wake = asyncio.Condition()  # notified when children are queued or the last page finishes
+
+            async def wake_workers():
+                async with wake:
+                    wake.notify_all()
+
+            async def visit(url, d):
+                async with limiters[up.urlsplit(url).netloc]:
+                    r = await cli.get(url)
                 if r.status_code != 200:
-                    continue
-                doc = html.fromstring(r.text)
-                can = canonical_url(doc, url)
-                if can not in seen:
-                    seen.add(can)
+                    return
+                # Same body as a page we already parsed (template/redirect dupes): no new
+                # links to find, but the URL itself still goes in the inventory
+                digest = hashlib.blake2b(r.content, digest_size=16).hexdigest()
+                first = first_url.setdefault(digest, url)
+                if first != url and d >= min_dedup_depth:
+                    dup = canonicalize(url)
+                    ok, ent = in_scope(dup, allow, block)
+                    if ok:
+                        hits[dup] = ent
+                        hashes[dup] = digest
+                        notes[dup] = f"duplicate_of {first}"
+                        frontier.add_hit(dup, ent)
+                    return
+                can, hrefs = await loop.run_in_executor(pool, parse_page, r.text, url)
+                enqueued.add(can)
+                frontier.mark(can)
                 ok, ent = in_scope(can, allow, block)
                 if ok:
                     hits[can] = ent
+                    hashes[can] = digest
+                    frontier.add_hit(can, ent)
                 # enqueue children
-                for href in doc.xpath("//a[@href]/@href"):
-                    nxt = up.urljoin(can, href.strip())
-                    if "#" in nxt:
-                        nxt = nxt.split("#",1)[0]
-                    if not same_domain(base, nxt):
+                queued = False
+                for nxt in hrefs:
+                    if not same_domain(base_netloc, nxt):
+                        continue
+                    if nxt not in enqueued:
+                        enqueued.add(nxt)
+                        queued |= frontier.push(nxt, d+1)
+                if queued:
+                    await wake_workers()
+
+            async def worker():
+                nonlocal active
+                while True:
+                    item = frontier.pop()
+                    if item is None:
+                        if active == 0:
+                            return
+                        # another worker may still push children: sleep until it does or ends
+                        async with wake:
+                            await wake.wait()
                         continue
-                    if nxt not in seen:
-                        q.append((nxt, d+1))
-                time.sleep(throttle)
-            except Exception:
-                continue
-    return hits
-
-def write_results(out_xl, hits):
-    now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%SZ")
-    rows = []
-    for u, e in sorted(hits.items()):
-        rows.append({
-            "url": u,
-            "entity": e,
-            "section": "",
-            "priority": "P1" if e in ("plan","device","promo") else "P2",
-            "discovery": "sitemap+crawl",
-            "status": "todo",
-            "requires_login": "",
-            "format": "",
-            "language": "en",
-            "last_seen": now,
-            "content_hash": "",
-            "owner": "",
-            "notes": ""
-        })
-    df = pd.DataFrame(rows)
-    summary = (df.groupby("entity")["url"].count().rename("count").reset_index()
-                 .sort_values("count", ascending=False))
-    with pd.ExcelWriter(out_xl, engine="xlsxwriter") as w:
-        df.to_excel(w, index=False, sheet_name="URL_Inventory")
-        summary.to_excel(w, index=False, sheet_name="Summary")
-    print("Wrote", len(df), "URLs to", out_xl)
+                    url, d = item
+                    active += 1
+                    try:
+                        if d <= max_depth:
+                            await visit(url, d)
+                    except Exception:
+                        pass
+                    finally:
+                        active -= 1
+                        frontier.done(url)
+                        if active == 0:
+                            await wake_workers()
+
+            await asyncio.gather(*(worker() for _ in range(workers)))
+    finally:
+        pool.shutdown(cancel_futures=True)
+        frontier.close()
+    return hits, hashes, notes
+
+def write_results(out_xl, hits, hashes=None, notes=None):
+    summary = write_inventory(out_xl, hits, "sitemap+crawl", hashes, notes)
     print("By entity:")
-    for _, r in summary.iterrows():
-        print("  ", r["entity"], "=", r["count"])
+    for ent, count in summary:
+        print("  ", ent, "=", count)
 
 def main():
     ap = argparse.ArgumentParser()
@@ -164,12 +217,19 @@ def main():
     ap.add_argument("--workbook", default="TFB_URL_Inventory.xlsx", help="Workbook with Seeds/Patterns")
     ap.add_argument("--out", default="TFB_URL_Inventory_FULL.xlsx", help="Output workbook")
     ap.add_argument("--depth", type=int, default=2, help="Crawl depth")
-    ap.add_argument("--throttle", type=float, default=0.75, help="Delay between requests (s)")
+    ap.add_argument("--throttle", type=float, default=0.75, help="Delay between requests to the same host (s)")
+    ap.add_argument("--workers", type=int, default=16, help="Concurrent fetch workers")
+    ap.add_argument("--frontier", default=None,
+                    help="SQLite file or redis:// URL to keep crawl state in (rerun to resume)")
+    ap.add_argument("--min-dedup-depth", type=int, default=1,
+                    help="Skip pages whose body was already seen only from this depth on (seeds are depth 0)")
     args = ap.parse_args()
 
     seeds, allow, block = read_patterns(args.workbook)
-    hits = discover_all(args.base, seeds, allow, block, max_depth=args.depth, throttle=args.throttle)
-    write_results(args.out, hits)
+    hits, hashes, notes = asyncio.run(discover_all(args.base, seeds, allow, block, max_depth=args.depth,
+                                                   throttle=args.throttle, workers=args.workers,
+                                                   frontier=args.frontier, min_dedup_depth=args.min_dedup_depth))
+    write_results(args.out, hits, hashes, notes)
 
 if __name__ == "__main__":
     main()
@@ -178,37 +238,6 @@ if __name__ == "__main__":
 
 # do this change
 
-def write_results(out_xl, hits):
-    from datetime import datetime
-    import pandas as pd
-
-    now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%SZ")
-    columns = ["url","entity","section","priority","discovery","status",
-               "requires_login","format","language","last_seen","content_hash",
-               "owner","notes"]
-
-    rows = [{
-        "url": u, "entity": e, "section": "", "priority": "P1" if e in ("plan","device","promo") else "P2",
-        "discovery": "sitemap+crawl", "status": "todo", "requires_login": "",
-        "format": "", "language": "en", "last_seen": now, "content_hash": "",
-        "owner": "", "notes": ""
-    } for u, e in sorted(hits.items())]
-
-    df = pd.DataFrame(rows, columns=columns)
-
-    # Build a summary even if empty
-    if not df.empty:
-        summary = (df.groupby("entity")["url"].count()
-                     .rename("count").reset_index()
-                     .sort_values("count", ascending=False))
-    else:
-        summary = pd.DataFrame({"entity": [], "count": []})
-
-    with pd.ExcelWriter(out_xl, engine="xlsxwriter") as w:
-        df.to_excel(w, index=False, sheet_name="URL_Inventory")
-        summary.to_excel(w, index=False, sheet_name="Summary")
-
-    print(f"Wrote {len(df)} URLs to {out_xl}")
-    if df.empty:
-        print("No in-scope pages found. Re-check Include_Patterns and crawl depth.")
-
+def write_results(out_xl, hits, hashes=None, notes=None):
+    write_inventory(out_xl, hits, "sitemap+crawl", hashes, notes,
+                    empty_msg="No in-scope pages found. Re-check Include_Patterns and crawl depth.")
@@ -12,11 +12,14 @@
 # 4) In this folder (with your workbook), run:
 #      python discovery_cdp.py --base "https://magentapulse.t-mobile.com" --workbook "TFB_URL_Inventory_UPDATED.xlsx" --out "TFB_URL_Inventory_FULL.xlsx" --depth 3 --throttle 0.7
 #
-import argparse, re, time, urllib.parse as up
-from collections import deque
-from datetime import datetime, timezone
+import argparse, urllib.parse as up
 import pandas as pd
 from playwright.sync_api import sync_playwright
+from frontier import open_frontier
+from urlnorm import canonicalize, same_domain
+from scope import compile_allow, compile_block, in_scope
+from inventory import write_inventory
+from browser_helpers import PAGE_LINKS_JS, block_heavy_resources, canonical_url, wait_for_host
 
 DEF_USER_AGENT = "Mozilla/5.0 (TFB-Discovery/1.0)"
 CDP_ENDPOINT = "http://localhost:9222"
@@ -25,30 +28,15 @@ def read_patterns(xl_path):
     inc = pd.read_excel(xl_path, sheet_name="Include_Patterns")
     exc = pd.read_excel(xl_path, sheet_name="Exclude_Patterns")
     seeds = pd.read_excel(xl_path, sheet_name="Seeds")["url"].dropna().tolist()
-    allow = [(re.compile(p, re.I), hint) for p, hint in zip(inc["allowed_path_regex"], inc["entity_hint"])]
-    block = [re.compile(p, re.I) for p in exc["disallowed_path_regex"]]
+    allow = compile_allow(list(zip(inc["allowed_path_regex"], inc["entity_hint"])))
+    block = compile_block(exc["disallowed_path_regex"])
     return seeds, allow, block
 
-def same_domain(base, url):
-    return up.urlsplit(url).netloc.endswith(up.urlsplit(base).netloc)
-
-def canonical_url(page_url, canonical_href):
-    if canonical_href:
-        return up.urljoin(page_url, canonical_href)
-    return page_url
-
-def in_scope(url, allow, block):
-    path = up.urlsplit(url).path
-    if any(b.search(path) for b in block):
-        return False, None
-    for pat, hint in allow:
-        if pat.search(path):
-            return True, hint
-    return False, None
-
-def discover_over_cdp(base, seeds, allow, block, depth=3, throttle=0.7):
-    hits, seen = {}, set()
-    q = deque()
+def discover_over_cdp(base, seeds, allow, block, depth=3, throttle=0.7, frontier=None):
+    base_netloc = up.urlsplit(base).netloc.lower()
+    frontier = open_frontier(frontier)  # persistent queue/seen/hits, so a rerun resumes
+    hits, enqueued = frontier.hits(), set()
+    next_ok = {}  # host -> monotonic time its next request may start
     with sync_playwright() as p:
         browser = p.chromium.connect_over_cdp(CDP_ENDPOINT)
         context = browser.contexts[0] if browser.contexts else browser.new_context(
@@ -60,42 +48,45 @@ def discover_over_cdp(base, seeds, allow, block, depth=3, throttle=0.7):
             page.wait_for_load_state("networkidle", timeout=6000)
         except:
             pass
-        for s in seeds:
-            if same_domain(base, s):
-                q.append((s, 0))
-        while q:
-            url, d = q.popleft()
-            if url in seen or d > depth:
-                continue
-            seen.add(url)
+        page.route("**/*", block_heavy_resources)  # crawl pages: skip images/CSS/fonts/media
+        for s in map(canonicalize, seeds):
+            if same_domain(base_netloc, s) and s not in enqueued:
+                enqueued.add(s)
+                frontier.push(s, 0)
+        while True:
+            item = frontier.pop()
+            if item is None:
+                break
+            url, d = item
             try:
-                page.goto(url, wait_until="domcontentloaded", timeout=90000)
-                try:
-                    page.wait_for_load_state("networkidle", timeout=8000)
-                except:
-                    pass
-                can_href = None
+                if d > depth:
+                    continue
+                wait_for_host(next_ok, url, throttle)
+                page.goto(url, wait_until="commit", timeout=90000)
+                # whole document parsed (cheap with sub-resources aborted), then a short
+                # grace period for script-inserted links or canonical tag to be attached
+                page.wait_for_load_state("domcontentloaded")
                 try:
-                    el = page.query_selector('link[rel="canonical"]')
-                    if el:
-                        can_href = el.get_attribute("href")
+                    page.wait_for_selector("a[href], link[rel=canonical]", state="attached", timeout=3000)
                 except:
                     pass
-                can = canonical_url(page.url, can_href)
+                data = page.evaluate(PAGE_LINKS_JS)
+                can = canonical_url(page.url, data["canonical"])
                 ok, ent = in_scope(can, allow, block)
                 if ok:
                     hits[can] = ent
-                hrefs = page.eval_on_selector_all("a[href]", "els => els.map(e => e.href)")
-                for href in hrefs:
+                    frontier.add_hit(can, ent)
+                for href in data["hrefs"]:
                     if not href:
                         continue
-                    if "#" in href:
-                        href = href.split("#", 1)[0]
-                    if same_domain(base, href) and href not in seen:
-                        q.append((href, d + 1))
-                time.sleep(throttle)
+                    href = canonicalize(href)
+                    if same_domain(base_netloc, href) and href not in enqueued:
+                        enqueued.add(href)
+                        frontier.push(href, d + 1)
             except Exception:
                 continue
+            finally:
+                frontier.done(url)
         # detach (do not close your real Chrome)
         try:
             page.close()
@@ -109,31 +100,12 @@ def discover_over_cdp(base, seeds, allow, block, depth=3, throttle=0.7):
             browser.close()
         except Exception:
             pass
+    frontier.close()
     return hits
 
 def write_results(out_xl, hits):
-    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%SZ")
-    columns = ["url","entity","section","priority","discovery","status","requires_login",
-               "format","language","last_seen","content_hash","owner","notes"]
-    rows = [{
-        "url": u, "entity": e, "section": "", "priority": "P1" if e in ("plan","device","promo") else "P2",
-        "discovery": "cdp", "status": "todo", "requires_login": "",
-        "format": "", "language": "en", "last_seen": now, "content_hash": "",
-        "owner": "", "notes": ""
-    } for u, e in sorted(hits.items())]
-    df = pd.DataFrame(rows, columns=columns)
-    if not df.empty:
-        summary = (df.groupby("entity")["url"].count()
-                     .rename("count").reset_index()
-                     .sort_values("count", ascending=False))
-    else:
-        summary = pd.DataFrame({"entity": [], "count": []})
-    with pd.ExcelWriter(out_xl, engine="xlsxwriter") as w:
-        df.to_excel(w, index=False, sheet_name="URL_Inventory")
-        summary.to_excel(w, index=False, sheet_name="Summary")
-    print(f"Wrote {len(df)} URLs to {out_xl}")
-    if df.empty:
-        print("No in-scope pages found. Make sure Chrome is running with --remote-debugging-port=9222 and you're logged in.")
+    write_inventory(out_xl, hits, "cdp",
+                    empty_msg="No in-scope pages found. Make sure Chrome is running with --remote-debugging-port=9222 and you're logged in.")
 
 def main():
     ap = argparse.ArgumentParser()
@@ -142,9 +114,11 @@ def main():
     ap.add_argument("--out", required=True)
     ap.add_argument("--depth", type=int, default=3)
     ap.add_argument("--throttle", type=float, default=0.7)
+    ap.add_argument("--frontier", default=None, help="SQLite file or redis:// URL for resumable crawl state")
     args = ap.parse_args()
     seeds, allow, block = read_patterns(args.workbook)
-    hits = discover_over_cdp(args.base, seeds, allow, block, depth=args.depth, throttle=args.throttle)
+    hits = discover_over_cdp(args.base, seeds, allow, block, depth=args.depth, throttle=args.throttle,
+                             frontier=args.frontier)
     write_results(args.out, hits)
 
 if __name__ == "__main__":
@@ -7,11 +7,14 @@
 #   python discovery_playwright.py --base https://magentapulse.t-mobile.com \
 #       --workbook TFB_URL_Inventory_UPDATED.xlsx --out TFB_URL_Inventory_FULL.xlsx --depth 2 --throttle 0.5
 #
-import argparse, re, time, urllib.parse as up
-from collections import deque
-from datetime import datetime, timezone
+import argparse, urllib.parse as up
 import pandas as pd
 from playwright.sync_api import sync_playwright
+from frontier import open_frontier
+from urlnorm import canonicalize, same_domain
+from scope import compile_allow, compile_block, in_scope
+from inventory import write_inventory
+from browser_helpers import PAGE_LINKS_JS, block_heavy_resources, canonical_url, wait_for_host
 import os
 
 chrome_profile = os.path.join(os.environ["LOCALAPPDATA"], "Google", "Chrome", "User Data")
@@ -22,31 +25,16 @@ def read_patterns(xl_path):
     inc = pd.read_excel(xl_path, sheet_name="Include_Patterns")
     exc = pd.read_excel(xl_path, sheet_name="Exclude_Patterns")
     seeds = pd.read_excel(xl_path, sheet_name="Seeds")["url"].dropna().tolist()
-    allow = [(re.compile(p, re.I), hint) for p, hint in zip(inc["allowed_path_regex"], inc["entity_hint"])]
-    block = [re.compile(p, re.I) for p in exc["disallowed_path_regex"]]
+    allow = compile_allow(list(zip(inc["allowed_path_regex"], inc["entity_hint"])))
+    block = compile_block(exc["disallowed_path_regex"])
     return seeds, allow, block
 
-def same_domain(base, url):
-    return up.urlsplit(url).netloc.endswith(up.urlsplit(base).netloc)
-
-def canonical_url(page_url, canonical_href):
-    if canonical_href:
-        return up.urljoin(page_url, canonical_href)
-    return page_url
-
-def in_scope(url, allow, block):
-    path = up.urlsplit(url).path
-    if any(b.search(path) for b in block):
-        return False, None
-    for pat, hint in allow:
-        if pat.search(path):
-            return True, hint
-    return False, None
-
-def discover_with_browser(base, seeds, allow, block, depth=2, throttle=0.5, user_data_dir="user_data"):
-    hits = {}
-    seen = set()
-    q = deque()
+def discover_with_browser(base, seeds, allow, block, depth=2, throttle=0.5, user_data_dir="user_data", frontier=None):
+    base_netloc = up.urlsplit(base).netloc.lower()
+    frontier = open_frontier(frontier)  # persistent queue/seen/hits, so a rerun resumes
+    hits = frontier.hits()
+    enqueued = set()
+    next_ok = {}  # host -> monotonic time its next request may start
 
     with sync_playwright() as p:
         # Persistent context stores your login/cookies between runs
@@ -59,78 +47,60 @@ def discover_with_browser(base, seeds, allow, block, depth=2, throttle=0.5, user
         page = browser.new_page()
         # visit a base page first to let you log in if needed
         page.goto(base, wait_until="domcontentloaded", timeout=60000)
+        # login done on a fully rendered page; from here on only documents/scripts load
+        page.route("**/*", block_heavy_resources)
 
         # BFS
-        for s in seeds:
-            if same_domain(base, s):
-                q.append((s, 0))
-
-        while q:
-            url, d = q.popleft()
-            if url in seen or d > depth:
-                continue
-            seen.add(url)
+        for s in map(canonicalize, seeds):
+            if same_domain(base_netloc, s) and s not in enqueued:
+                enqueued.add(s)
+                frontier.push(s, 0)
+
+        while True:
+            item = frontier.pop()
+            if item is None:
+                break
+            url, d = item
             try:
-                page.goto(url, wait_until="domcontentloaded", timeout=90000)
+                if d > depth:
+                    continue
+                wait_for_host(next_ok, url, throttle)
+                page.goto(url, wait_until="commit", timeout=90000)
+                page.wait_for_load_state("domcontentloaded")
                 # try to wait a bit for dynamic links
                 try:
-                    page.wait_for_load_state("networkidle", timeout=8000)
+                    page.wait_for_selector("a[href], link[rel=canonical]", state="attached", timeout=3000)
                 except:
                     pass
-                # get canonical href if present
-                can_href = None
-                try:
-                    el = page.query_selector('link[rel="canonical"]')
-                    if el:
-                        can_href = el.get_attribute("href")
-                except:
-                    pass
-                can = canonical_url(page.url, can_href)
+                # canonical href (if present) and all links in one round-trip
+                data = page.evaluate(PAGE_LINKS_JS)
+                can = canonical_url(page.url, data["canonical"])
 
                 ok, ent = in_scope(can, allow, block)
                 if ok:
                     hits[can] = ent
+                    frontier.add_hit(can, ent)
 
-                hrefs = page.eval_on_selector_all("a[href]", "els => els.map(e => e.href)")
-                for href in hrefs:
+                for href in data["hrefs"]:
                     if not href:
                         continue
-                    # strip fragments
-                    if "#" in href:
-                        href = href.split("#", 1)[0]
-                    if same_domain(base, href) and href not in seen:
-                        q.append((href, d+1))
-                time.sleep(throttle)
+                    href = canonicalize(href)
+                    if same_domain(base_netloc, href) and href not in enqueued:
+                        enqueued.add(href)
+                        frontier.push(href, d+1)
             except Exception as e:
                 # skip pages that error out
                 continue
+            finally:
+                frontier.done(url)
 
         browser.close()
+    frontier.close()
     return hits
 
 def write_results(out_xl, hits):
-    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%SZ")
-    columns = ["url","entity","section","priority","discovery","status","requires_login",
-               "format","language","last_seen","content_hash","owner","notes"]
-    rows = [{
-        "url": u, "entity": e, "section": "", "priority": "P1" if e in ("plan","device","promo") else "P2",
-        "discovery": "playwright", "status": "todo", "requires_login": "",
-        "format": "", "language": "en", "last_seen": now, "content_hash": "",
-        "owner": "", "notes": ""
-    } for u, e in sorted(hits.items())]
-    df = pd.DataFrame(rows, columns=columns)
-    if not df.empty:
-        summary = (df.groupby("entity")["url"].count()
-                     .rename("count").reset_index()
-                     .sort_values("count", ascending=False))
-    else:
-        summary = pd.DataFrame({"entity": [], "count": []})
-    with pd.ExcelWriter(out_xl, engine="xlsxwriter") as w:
-        df.to_excel(w, index=False, sheet_name="URL_Inventory")
-        summary.to_excel(w, index=False, sheet_name="Summary")
-    print(f"Wrote {len(df)} URLs to {out_xl}")
-    if df.empty:
-        print("No in-scope pages found. Ensure you're logged in and increase depth.")
+    write_inventory(out_xl, hits, "playwright",
+                    empty_msg="No in-scope pages found. Ensure you're logged in and increase depth.")
 
 def main():
     ap = argparse.ArgumentParser()
@@ -139,10 +109,12 @@ def main():
     ap.add_argument("--out", required=True)
     ap.add_argument("--depth", type=int, default=2)
     ap.add_argument("--throttle", type=float, default=0.5)
+    ap.add_argument("--frontier", default=None, help="SQLite file or redis:// URL for resumable crawl state")
     args = ap.parse_args()
 
     seeds, allow, block = read_patterns(args.workbook)
-    hits = discover_with_browser(args.base, seeds, allow, block, depth=args.depth, throttle=args.throttle)
+    hits = discover_with_browser(args.base, seeds, allow, block, depth=args.depth, throttle=args.throttle,
+                                 frontier=args.frontier)
     write_results(args.out, hits)
 
 if __name__ == "__main__":
@@ -153,10 +125,12 @@ if __name__ == "__main__":
 
 # Replace
 
-def discover_with_browser(base, seeds, allow, block, depth=2, throttle=0.5, user_data_dir=PRIVATE_PROFILE_DIR):
-    hits = {}
-    seen = set()
-    q = deque()
+def discover_with_browser(base, seeds, allow, block, depth=2, throttle=0.5, user_data_dir=PRIVATE_PROFILE_DIR, frontier=None):
+    base_netloc = up.urlsplit(base).netloc.lower()
+    frontier = open_frontier(frontier)  # persistent queue/seen/hits, so a rerun resumes
+    hits = frontier.hits()
+    enqueued = set()
+    next_ok = {}  # host -> monotonic time its next request may start
 
     with sync_playwright() as p:
         # Launch Chrome with a fresh, local profile (NOT the enterprise profile)
@@ -184,51 +158,55 @@ def discover_with_browser(base, seeds, allow, block, depth=2, throttle=0.5, user
         page.goto(base, wait_until="domcontentloaded", timeout=90000)
         print("\n*** Log in in the opened Chrome window (fresh profile) ***")
         input("Press ENTER here after you are fully signed in and can browse … ")
+        page.route("**/*", block_heavy_resources)  # only documents/scripts from here on
 
         # BFS crawl
-        for s in seeds:
-            if same_domain(base, s):
-                q.append((s, 0))
-
-        while q:
-            url, d = q.popleft()
-            if url in seen or d > depth:
-                continue
-            seen.add(url)
+        for s in map(canonicalize, seeds):
+            if same_domain(base_netloc, s) and s not in enqueued:
+                enqueued.add(s)
+                frontier.push(s, 0)
+
+        while True:
+            item = frontier.pop()
+            if item is None:
+                break
+            url, d = item
             try:
-                page.goto(url, wait_until="domcontentloaded", timeout=90000)
+                if d > depth:
+                    continue
+                wait_for_host(next_ok, url, throttle)
+                page.goto(url, wait_until="commit", timeout=90000)
+                # whole document parsed (cheap with sub-resources aborted), then a short
+                # grace period for script-inserted links or canonical tag to be attached
+                page.wait_for_load_state("domcontentloaded")
                 try:
-                    page.wait_for_load_state("networkidle", timeout=8000)
+                    page.wait_for_selector("a[href], link[rel=canonical]", state="attached", timeout=3000)
                 except:
                     pass
 
-                # canonical
-                can_href = None
-                try:
-                    el = page.query_selector('link[rel="canonical"]')
-                    if el:
-                        can_href = el.get_attribute("href")
-                except:
-                    pass
-                can = canonical_url(page.url, can_href)
+                # canonical + links, fetched together
+                data = page.evaluate(PAGE_LINKS_JS)
+                can = canonical_url(page.url, data["canonical"])
 
                 ok, ent = in_scope(can, allow, block)
                 if ok:
                     hits[can] = ent
+                    frontier.add_hit(can, ent)
 
                 # enqueue children
-                hrefs = page.eval_on_selector_all("a[href]", "els => els.map(e => e.href)")
-                for href in hrefs:
+                for href in data["hrefs"]:
                     if not href:
                         continue
-                    if "#" in href:
-                        href = href.split("#", 1)[0]
-                    if same_domain(base, href) and href not in seen:
-                        q.append((href, d + 1))
+                    href = canonicalize(href)
+                    if same_domain(base_netloc, href) and href not in enqueued:
+                        enqueued.add(href)
+                        frontier.push(href, d + 1)
 
-                time.sleep(throttle)
             except Exception:
                 continue
+            finally:
+                frontier.done(url)
 
         browser.close()
+    frontier.close()
     return hits
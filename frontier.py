@@ -0,0 +1,117 @@
+
+# frontier.py
+# Persistent crawl frontier: the URL queue, the "ever queued" set and the hits found so far.
+# SQLite by default (one host, resumable after a crash or Ctrl-C); pass a redis:// URL to
+# share one frontier between several crawler processes.
+
+import sqlite3
+
+def open_frontier(spec=None):
+    """None/":memory:" -> throwaway in-memory frontier, redis://... -> Redis, else a SQLite file."""
+    if spec and spec.startswith(("redis://", "rediss://")):
+        return RedisFrontier(spec)
+    return Frontier(spec or ":memory:")
+
+class Frontier:
+    """SQLite-backed FIFO frontier. Popped URLs stay in the queue until done(), so
+    pages that were in flight when a run died are fetched again on resume."""
+
+    def __init__(self, path="frontier.sqlite3"):
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS seen  (url TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS queue (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                              url TEXT NOT NULL UNIQUE, depth INTEGER NOT NULL,
+                                              taken INTEGER NOT NULL DEFAULT 0);
+            CREATE TABLE IF NOT EXISTS hits  (url TEXT PRIMARY KEY, entity TEXT);
+            UPDATE queue SET taken = 0;
+        """)
+        self.db.commit()
+
+    def push(self, url, depth):
+        """Queue `url` unless it was ever queued or marked before; True if it was added."""
+        with self.db:
+            cur = self.db.execute("INSERT OR IGNORE INTO seen (url) VALUES (?)", (url,))
+            if cur.rowcount:
+                self.db.execute("INSERT INTO queue (url, depth) VALUES (?, ?)", (url, depth))
+        return cur.rowcount == 1
+
+    def pop(self):
+        """Oldest pending (url, depth), or None when nothing is waiting."""
+        with self.db:
+            row = self.db.execute(
+                "SELECT id, url, depth FROM queue WHERE taken = 0 ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE queue SET taken = 1 WHERE id = ?", (row[0],))
+        return row[1], row[2]
+
+    def done(self, url):
+        with self.db:
+            self.db.execute("DELETE FROM queue WHERE url = ?", (url,))
+
+    def seen(self, url):
+        return self.db.execute("SELECT 1 FROM seen WHERE url = ?", (url,)).fetchone() is not None
+
+    def mark(self, url):
+        """Record `url` as seen without queueing it (e.g. a page's canonical URL)."""
+        with self.db:
+            self.db.execute("INSERT OR IGNORE INTO seen (url) VALUES (?)", (url,))
+
+    def add_hit(self, url, entity):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO hits (url, entity) VALUES (?, ?)", (url, entity))
+
+    def hits(self):
+        return dict(self.db.execute("SELECT url, entity FROM hits"))
+
+    def close(self):
+        self.db.close()
+
+class RedisFrontier:
+    """Same interface on Redis: SADD + LPUSH in one Lua call so two workers can't both
+    queue a URL. In-flight URLs are not tracked; done() is a no-op."""
+
+    _PUSH = """
+        if redis.call('SADD', KEYS[1], ARGV[1]) == 1 then
+            redis.call('LPUSH', KEYS[2], ARGV[2] .. ' ' .. ARGV[1])
+            return 1
+        end
+        return 0
+    """
+
+    def __init__(self, url, key="frontier"):
+        import redis
+        self.r = redis.Redis.from_url(url, decode_responses=True)
+        self.seen_key, self.queue_key, self.hits_key = f"{key}:seen", f"{key}:queue", f"{key}:hits"
+        self._push = self.r.register_script(self._PUSH)
+
+    def push(self, url, depth):
+        return self._push(keys=[self.seen_key, self.queue_key], args=[url, depth]) == 1
+
+    def pop(self):
+        item = self.r.rpop(self.queue_key)
+        if item is None:
+            return None
+        depth, url = item.split(" ", 1)
+        return url, int(depth)
+
+    def done(self, url):
+        pass
+
+    def seen(self, url):
+        return bool(self.r.sismember(self.seen_key, url))
+
+    def mark(self, url):
+        self.r.sadd(self.seen_key, url)
+
+    def add_hit(self, url, entity):
+        self.r.hset(self.hits_key, url, entity or "")
+
+    def hits(self):
+        return self.r.hgetall(self.hits_key)
+
+    def close(self):
+        self.r.close()
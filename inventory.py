@@ -0,0 +1,52 @@
+
+# inventory.py
+# Shared URL_Inventory workbook writer for the discovery scripts: one row per in-scope URL
+# plus a Summary sheet of counts per entity. Each script only supplies its `discovery` label.
+
+from collections import Counter
+from datetime import datetime, timezone
+import xlsxwriter
+
+COLUMNS = ["url","entity","section","priority","discovery","status","requires_login",
+           "format","language","last_seen","content_hash","owner","notes"]
+
+def write_inventory(out_xl, hits, discovery, hashes=None, notes=None, empty_msg=None):
+    """Write `hits` (url -> entity) to `out_xl`; returns the Summary rows (entity, count)."""
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%SZ")
+    hashes, notes = hashes or {}, notes or {}
+    urls, ents, prios, digests, remarks = [], [], [], [], []
+    for u, e in sorted(hits.items()):
+        e = e if isinstance(e, str) else None  # blank hint cells come back as NaN
+        urls.append(u)
+        ents.append(e)
+        prios.append("P1" if e in ("plan","device","promo") else "P2")
+        digests.append(hashes.get(u, ""))
+        remarks.append(notes.get(u, ""))
+    n = len(urls)
+    blank = [""] * n
+    data = {
+        "url": urls, "entity": ents, "section": blank, "priority": prios,
+        "discovery": [discovery] * n, "status": ["todo"] * n, "requires_login": blank,
+        "format": blank, "language": ["en"] * n, "last_seen": [now] * n,
+        "content_hash": digests, "owner": blank, "notes": remarks
+    }
+
+    # Straight to xlsxwriter, no DataFrame round-trip. constant_memory flushes each row
+    # to disk once the next one starts, so rows go out in order with write_row().
+    wb = xlsxwriter.Workbook(out_xl, {"constant_memory": True})
+    header = wb.add_format({"bold": True, "border": 1})
+    ws = wb.add_worksheet("URL_Inventory")
+    ws.write_row(0, 0, COLUMNS, header)
+    for i, row in enumerate(zip(*(data[c] for c in COLUMNS)), start=1):
+        ws.write_row(i, 0, row)
+    summary = Counter(e for e in ents if e is not None).most_common()
+    ws = wb.add_worksheet("Summary")
+    ws.write_row(0, 0, ["entity", "count"], header)
+    for i, row in enumerate(summary, start=1):
+        ws.write_row(i, 0, row)
+    wb.close()
+
+    print(f"Wrote {n} URLs to {out_xl}")
+    if not n and empty_msg:
+        print(empty_msg)
+    return summary
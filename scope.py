@@ -0,0 +1,60 @@
+
+# scope.py
+# Shared Include/Exclude matching for the discovery scripts: the workbook's path regexes
+# compiled once, so every script decides "is this URL in scope, and as what?" the same way.
+
+import re, urllib.parse as up
+import ahocorasick
+
+def compile_block(patterns):
+    # All Exclude rows as one alternation: a single regex search per path
+    return re.compile("|".join(f"(?:{p})" for p in patterns) or "(?!)", re.I)
+
+# An Include row that is just a literal path piece, optionally ^-anchored and followed by a
+# catch-all tail (".*", ".+", ".+?(?:\?.*)?$", ...), needs no regex engine to test
+_LITERAL_ROW = re.compile(r"(\^?)((?:[\w\-/~%]|\\[^\w\s])+)(?:\.([*+])\??(?:\(\?:[^()]*\)\?)*\$?)?$")
+
+def compile_allow(rows):
+    # Literal rows go into one Aho-Corasick automaton (a single pass over the path finds
+    # them all); the rest become one lookahead per row, tried in sheet order, whose empty
+    # marker group names the row. in_scope() takes the lowest matching row of the two,
+    # so the first matching row in the sheet still wins.
+    literals, alts = ahocorasick.Automaton(), []
+    for i, (p, _) in enumerate(rows):
+        m = _LITERAL_ROW.match(str(p))
+        if m:
+            anchor, lit, tail = m.groups()
+            lit = re.sub(r"\\(.)", r"\1", lit).lower()
+            # (row, must start the path, chars required after it, length)
+            literals.add_word(lit, literals.get(lit, []) + [(i, bool(anchor), int(tail == "+"), len(lit))])
+        else:
+            alts.append(f"(?=.*?(?:{p}))(?P<r{i}>)")
+    if literals.kind != ahocorasick.EMPTY:
+        literals.make_automaton()
+    return literals, re.compile("|".join(alts) or "(?!)", re.I), [hint for _, hint in rows]
+
+def literal_row(literals, path):
+    # Lowest Include row whose literal occurs in `path` (None if none does)
+    if literals.kind == ahocorasick.EMPTY:
+        return None
+    path = path.lower()
+    best = None
+    for end, entries in literals.iter(path):
+        for i, anchored, tail, size in entries:
+            if (best is None or i < best) and (not anchored or end + 1 == size) and len(path) - end - 1 >= tail:
+                best = i
+    return best
+
+def in_scope(url, allow, block):
+    path = up.urlsplit(url).path
+    if block.search(path):
+        return False, None
+    literals, allow_re, hints = allow
+    row = literal_row(literals, path)
+    m = allow_re.match(path)
+    if m:
+        i = int(m.lastgroup[1:])
+        row = i if row is None else min(row, i)
+    if row is None:
+        return False, None
+    return True, hints[row]
@@ -0,0 +1,35 @@
+
+# urlnorm.py
+# Shared URL canonicalization for the crawlers, so `https://X/a?c=2&b=1#top`
+# and `https://x:443/a?b=1&c=2` dedup to the same frontier entry. The trailing slash is
+# kept: `/docs/` and `/docs` are different bases for the page's relative links.
+
+import re, urllib.parse as up
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+_MULTI_SLASH = re.compile(r"/{2,}")
+
+def canonicalize(u):
+    """Lowercase scheme/host, drop default port and fragment, sort the query pairs,
+    and collapse duplicate slashes."""
+    parts = up.urlsplit(u.strip())
+    scheme = parts.scheme.lower()
+    userinfo, at, hostport = parts.netloc.rpartition("@")
+    hostport = hostport.lower()
+    host, colon, port = hostport.rpartition(":")
+    if colon and port == DEFAULT_PORTS.get(scheme):
+        hostport = host
+    path = _MULTI_SLASH.sub("/", parts.path) or "/"
+    # sort the raw pairs: decoding and re-encoding would turn `?x` into `?x=` and
+    # mangle undecodable escapes, producing URLs the site never linked to
+    query = "&".join(sorted(p for p in parts.query.split("&") if p))
+    return up.urlunsplit((scheme, userinfo + at + hostport, path, query, ""))
+
+_HOST_RE = re.compile(r"https?://([^/?#]+)", re.I)
+
+def same_domain(base_netloc, url):
+    """True if `url`'s host ends with `base_netloc` (lowercased, split once by the caller).
+    Runs for every extracted href, so it matches the authority with a regex rather
+    than two urlsplit() calls."""
+    m = _HOST_RE.match(url)
+    return m is not None and m.group(1).lower().endswith(base_netloc)